@@ -152,6 +152,7 @@ class AIChatUI:
         self.root.bind("<F8>", self.open_llm_settings)
         if self.rag_model:
             self.root.bind("<F9>", self.handle_rag_toggle)
+        self.root.protocol("WM_DELETE_WINDOW", self.handle_window_close)
 
         self.apply_theme(self.theme)
 
@@ -255,6 +256,7 @@ class AIChatUI:
             if self.tts_model:
                 self.audio_io.stop_playing()
             self.append_to_chat_partial(RoleNames.ASSISTANT, "(canceled)")
+            self.chat_history.flush()
             self.check_tts_completion()
             return
 
@@ -263,6 +265,8 @@ class AIChatUI:
             self.append_to_chat_partial(RoleNames.ASSISTANT, token)
             self.root.after(100, self.display_ai_response, generator)
         except StopIteration:
+            # Persist the whole reply now, TTS playback may still take a while
+            self.chat_history.flush()
             self.check_tts_completion()
 
     def generate_ai_response(self, user_message, image_path: None):
@@ -319,6 +323,11 @@ class AIChatUI:
         self.chat_display.handle_response_readiness(last_message)
         self.update_statistics()
 
+    def handle_window_close(self):
+        """Save pending chat data before closing the main window."""
+        self.chat_history.flush()
+        self.root.destroy()
+
     def speak_text(self, text):
         """Speak the given text using TTS."""
         if not self.tts_enabled:
@@ -367,12 +376,10 @@ class AIChatUI:
 
     def append_to_chat_partial(self, role, token):
         """Append a token to the chat display for partial updates."""
-        messages = self.chat_history.get_active_chat_messages()
+        last_role = self.chat_history.get_last_message_role()
 
         # If it's the first token for assistant
-        is_first_token = RoleNames.ASSISTANT and (
-            not messages or messages[-1]["role"] != RoleNames.ASSISTANT
-        )
+        is_first_token = RoleNames.ASSISTANT and last_role != RoleNames.ASSISTANT
 
         self.chat_display.append_partial(role, token, is_first_token)
         self.chat_history.append_message_partial(role, token, is_first_token)
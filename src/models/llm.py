@@ -15,6 +15,7 @@ from ollama import (
     ps,
 )
 import threading
+import time
 
 from .common import BaseModel
 from ..utils import print_system_message
@@ -66,6 +67,9 @@ class LLM(BaseModel):
         model: An instance of the ollama.Client for interacting with the LLM.
     """
 
+    # Seconds a preload is considered fresh, ollama keeps a model loaded for 5 minutes
+    PRELOAD_INTERVAL = 240.0
+
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
 
@@ -86,6 +90,8 @@ class LLM(BaseModel):
 
         self.model_id_dyn = None
         self.response_statistic = None
+        # model, options and time of the last preload
+        self._last_preload = (None, None, 0.0)
 
         # status update
         self._stop_event = threading.Event()
@@ -199,6 +205,36 @@ class LLM(BaseModel):
             log_level=logging.INFO,
         )
 
+    def _get_model_id(self) -> str:
+        """Get the model used for requests, the dynamic one takes precedence."""
+        return self.model_id_dyn if self.model_id_dyn is not None else self.model_id
+
+    def needs_preload(self) -> bool:
+        """Check if the model with current options was not preloaded recently."""
+        model_id, options, preloaded_at = self._last_preload
+        return (
+            model_id != self._get_model_id()
+            or options != self.options
+            or time.monotonic() - preloaded_at >= self.PRELOAD_INTERVAL
+        )
+
+    def preload(self):
+        """Load the model into memory, so that the next request does not wait for it."""
+        if not self.needs_preload():
+            return
+
+        self._last_preload = (self._get_model_id(), self.options, time.monotonic())
+        try:
+            # NOTE: ollama loads the model without generating anything for an empty prompt
+            self.model.generate(
+                model=self._get_model_id(), prompt="", options=self.options
+            )
+        except Exception as e:
+            self._last_preload = (None, None, 0.0)
+            print_system_message(
+                f"Cannot preload model: {e}", log_level=logging.WARNING
+            )
+
     def exists(self) -> bool:
         """
         Check if the specified LLM model exists.
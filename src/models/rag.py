@@ -1,18 +1,22 @@
-import chromadb
 from dataclasses import dataclass
 import datetime
+import functools
+import hashlib
+import json
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib.util import find_spec
+from queue import Full, Queue
+import threading
 from typing import Dict, Iterator, List, Optional
 from pathlib import Path
 
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
+import torch
+from llama_index.core import SimpleDirectoryReader
 from llama_index.core.ingestion import IngestionPipeline
-from llama_index.core.schema import BaseNode, TransformComponent
+from llama_index.core.schema import BaseNode, Document, TransformComponent
 from llama_index.core.text_splitter import SentenceSplitter
-from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core.vector_stores import MetadataFilters
-from llama_index.readers.json import JSONReader
 from llama_index.core import Settings
 
 from .common import BaseModel
@@ -28,21 +32,66 @@ class RAGQuery:
     metadata_filters: Optional[MetadataFilters] = None
 
 
+# NOTE: kept outside of TextCleaner as pydantic rejects non-field class attributes
+TABS_TABLE = str.maketrans({"\t": " "})
+
+
 class TextCleaner(TransformComponent):
     """Cleans text by removing unwanted characters and formatting."""
 
     def __call__(self, nodes: List[BaseNode], **kwargs) -> List[BaseNode]:
         for node in nodes:
-            content = node.get_content()
-            content = content.replace("\t", " ").replace(" \n", " ")
+            content = node.get_content().translate(TABS_TABLE).replace(" \n", " ")
             node.set_content(content)
         return nodes
 
 
+# NOTE: the cleaner is stateless, so all pipelines share it
+TEXT_CLEANER = TextCleaner()
+
+
 class RAG(BaseModel):
     """Manages RAG on document collections using ChromaDB."""
 
+    # Maximal amount of parsed files waiting to be chunked and embedded
+    INGEST_QUEUE_SIZE = 4
+    # Amount of files parsed in parallel
+    READER_WORKERS = 4
+    # Amount of chunk metadatas fetched from ChromaDB at once
+    METADATA_PAGE_SIZE = 10000
+    # Amount of chunks written to ChromaDB at once
+    WRITE_BATCH_SIZE = 1000
+    # Amount of recent queries whose embeddings are kept in memory
+    QUERY_EMBEDDING_CACHE_SIZE = 1024
+    # Rough amount of characters per LLM token used to estimate prompt length
+    CHARS_PER_TOKEN = 4
+    # Share of the LLM context window retrieved context may take, leaving the rest
+    # for the chat history, the question and the answer
+    CONTEXT_WINDOW_SHARE = 0.5
+    # Context window assumed when num_ctx is not configured, the smallest Ollama
+    # default, so that the cap errs on the safe side
+    DEFAULT_NUM_CTX = 2048
+    # Int8 quantized export of the embed model used with the "onnx" backend
+    ONNX_MODEL_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+    # ChromaDB operators by metadata filter operators
+    CHROMA_OPERATORS = {
+        "==": "$eq",
+        "!=": "$ne",
+        ">": "$gt",
+        ">=": "$gte",
+        "<": "$lt",
+        "<=": "$lte",
+        "in": "$in",
+        "nin": "$nin",
+    }
+
     def __init__(self, llm_model: LLM, **kwargs):
+        # NOTE: imported here to not slow down the start when RAG is disabled
+        import chromadb
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        from llama_index.llms.ollama import Ollama
+        from llama_index.readers.json import JSONReader
+
         # Merge default params with user-provided params
         super().__init__(**kwargs)
 
@@ -51,6 +100,7 @@ class RAG(BaseModel):
         self.persist_dir.mkdir(parents=True, exist_ok=True)
 
         self.embed_model_name = kwargs["embed_model_name"]
+        self.embed_backend = kwargs["embed_backend"]
         self.chunk_size = kwargs["chunk_size"]
         self.chunk_overlap = kwargs["chunk_overlap"]
         self.similarity_top_k = kwargs["similarity_top_k"]
@@ -60,15 +110,48 @@ class RAG(BaseModel):
         # extra file extractors beyound https://docs.llamaindex.ai/en/stable/module_guides/loading/simpledirectoryreader/
         self.file_extractor = {".json": JSONReader()}
 
+        embed_device = self.device
+        if self.embed_backend == "onnx":
+            # NOTE: optional packages, checked here to fail with a clear message
+            if not all(find_spec(name) for name in ("optimum", "onnxruntime")):
+                raise ImportError(
+                    'embed_backend "onnx" requires: pip install "optimum[onnxruntime]"'
+                )
+            # NOTE: int8 weights run on ONNX Runtime with VNNI instructions on CPU
+            model_kwargs = {"file_name": self.ONNX_MODEL_FILE}
+            embed_device = "cpu"
+        elif self.device == "cuda":
+            # NOTE: half precision halves memory traffic of the forward pass on GPU,
+            # but is slower than full precision on CPU
+            model_kwargs = {"torch_dtype": torch.float16}
+        else:
+            model_kwargs = {}
         self.embed_model = HuggingFaceEmbedding(
-            model_name=self.embed_model_name, cache_folder=kwargs["embed_cache"]
+            model_name=self.embed_model_name,
+            cache_folder=kwargs["embed_cache"],
+            embed_batch_size=kwargs["embed_batch_size"],
+            device=embed_device,
+            backend=self.embed_backend,
+            model_kwargs=model_kwargs,
         )
         self.chroma_client = chromadb.PersistentClient(path=str(self.persist_dir))
         Settings.embed_model = self.embed_model
         # NOTE: set it only to prevent switching to defaults (which is OpenAI)
         Settings.llm = Ollama(model=llm_model.model_id)
 
+        self._text_splitter = SentenceSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+        )
         self._pipelines = {}
+        self._collections = {}
+        # last metadata filters with their ChromaDB where clause
+        self._last_where = (None, None)
+        self._embed_query = functools.lru_cache(
+            maxsize=self.QUERY_EMBEDDING_CACHE_SIZE
+        )(self.embed_model.get_query_embedding)
+        # summary of all collections, reused while the database is not modified
+        self._collections_info_path = self.persist_dir / "collections_info.json"
 
     def _format_prompt(self, **kwargs) -> str:
         # Validate template contains required placeholders
@@ -85,13 +168,102 @@ class RAG(BaseModel):
         Returns:
             List[dict]: List of collection information dictionaries
         """
+        db_version = self._get_db_version()
+        collection_infos = self._load_collection_infos(db_version)
+
         collections = []
+        is_complete = True
         for name in self.chroma_client.list_collections():
-            info = self.get_collection_info(name)
+            info = collection_infos.get(name) or self.get_collection_info(name)
             if info:
                 collections.append(info)
+            else:
+                is_complete = False
+
+        if is_complete:
+            self._save_collection_infos(
+                db_version, {info["name"]: info for info in collections}
+            )
+
         return collections
 
+    def _load_collection_infos(self, db_version: List[int]) -> Dict[str, dict]:
+        """
+        Load stored collection summaries if they were made for the given database version.
+
+        Args:
+            db_version (List[int]): Current version of the database
+
+        Returns:
+            Dict[str, dict]: Collection information by collection name
+        """
+        try:
+            stored = json.loads(self._collections_info_path.read_text())
+            if stored["db_version"] == db_version:
+                return stored["collection_infos"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _save_collection_infos(
+        self, db_version: List[int], collection_infos: Dict[str, dict]
+    ) -> None:
+        """
+        Store collection summaries made for the given database version.
+
+        Args:
+            db_version (List[int]): Version of the database summaries were made for
+            collection_infos (Dict[str, dict]): Collection information by collection name
+        """
+        self._collections_info_path.write_text(
+            json.dumps({"db_version": db_version, "collection_infos": collection_infos})
+        )
+
+    def _update_collection_info(
+        self,
+        db_version: List[int],
+        collection_name: str,
+        sources: Optional[List[str]] = None,
+        files: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Update stored summary of a collection after it was modified, so that other
+        collections are not rescanned. Without added sources and files, the collection
+        is rescanned on the next listing.
+
+        Args:
+            db_version (List[int]): Version of the database before the modification
+            collection_name (str): Name of the modified collection
+            sources (Optional[List[str]]): Sources added to the collection
+            files (Optional[List[str]]): Files added to the collection
+        """
+        collection_infos = self._load_collection_infos(db_version)
+        info = collection_infos.pop(collection_name, None)
+
+        if info and sources is not None and files is not None:
+            info["document_count"] = self.get_collection(collection_name).count()
+            info["unique_sources"] = list(set(info["unique_sources"]).union(sources))
+            info["unique_files"] = list(set(info["unique_files"]).union(files))
+            collection_infos[collection_name] = info
+
+        self._save_collection_infos(self._get_db_version(), collection_infos)
+
+    def _get_db_version(self) -> List[int]:
+        """
+        Get a version of the ChromaDB database which changes on every write to it.
+
+        Returns:
+            List[int]: Modification times of the database files
+        """
+        return [
+            path.stat().st_mtime_ns
+            for path in (
+                self.persist_dir / "chroma.sqlite3",
+                self.persist_dir / "chroma.sqlite3-wal",
+            )
+            if path.exists()
+        ]
+
     def get_collection_info(self, collection_name: str) -> Optional[dict]:
         """
         Get detailed information about a specific collection.
@@ -104,11 +276,14 @@ class RAG(BaseModel):
         """
         try:
             collection = self.get_collection(collection_name)
-            metadata_result = collection.get(include=["metadatas"])
-            metadatas = metadata_result.get("metadatas", [])
 
-            unique_sources = {meta.get("source") for meta in metadatas if meta}
-            unique_files = {meta.get("file_path") for meta in metadatas if meta}
+            unique_sources = set()
+            unique_files = set()
+            for meta in self._iter_metadatas(collection):
+                if meta:
+                    unique_sources.add(meta.get("source"))
+                    unique_files.add(meta.get("file_path"))
+
             return {
                 "name": collection_name,
                 "document_count": collection.count(),
@@ -119,6 +294,28 @@ class RAG(BaseModel):
             print(f"Error fetching collection '{collection_name}': {e}")
             return None
 
+    def _iter_metadatas(self, collection) -> Iterator[Optional[dict]]:
+        """
+        Iterate over metadatas of all chunks in a collection page by page, so that
+        only a single page is kept in memory at once.
+
+        Args:
+            collection (chromadb.Collection): The ChromaDB collection
+
+        Returns:
+            Iterator[Optional[dict]]: Chunk metadatas
+        """
+        offset = 0
+        while True:
+            metadatas = collection.get(
+                include=["metadatas"], limit=self.METADATA_PAGE_SIZE, offset=offset
+            )["metadatas"]
+            yield from metadatas
+
+            if len(metadatas) < self.METADATA_PAGE_SIZE:
+                break
+            offset += len(metadatas)
+
     def add_documents(
         self, path: str, collection_name: str, file_filter: Optional[List[str]] = None
     ):
@@ -144,40 +341,204 @@ class RAG(BaseModel):
                 recursive=True,
             )
 
-        documents = reader.load_data()
+        collection = self.get_collection(collection_name)
         pipeline = self._get_or_create_pipeline(collection_name)
-        nodes = pipeline.run(documents=documents)
-
-        # Generate unique IDs for each chunk based on source and chunk index
-        metadata = []
-        for i, node in enumerate(nodes):
-            # Get actual source file path from node metadata
-            file_path = node.metadata.get("file_path", str(path))
-
-            unique_id = (
-                f"{path.stem}_"
-                f"{Path(file_path).stem}_"
-                f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_"
-                f"{i}"
-            )
-            meta = {
-                "id": unique_id,
+
+        # All chunks of a single ingest share the same creation time
+        created_at = datetime.datetime.now().isoformat()
+
+        db_version = self._get_db_version()
+        batch_size = min(self.WRITE_BATCH_SIZE, self.chroma_client.get_max_batch_size())
+
+        # Chunk and embed each file while the next ones are still being parsed,
+        # chunks are written as soon as a batch is full to keep memory bounded
+        documents_content, embeddings, metadata = [], [], []
+        files = set()
+        for documents in self._iter_documents(reader):
+            file_nodes = pipeline.run(documents=documents)
+
+            # Metadata shared by all chunks of the file
+            file_meta = {
                 "source": str(path),
-                "file_path": file_path,
                 "chunk_size": self.chunk_size,
-                "created_at": datetime.datetime.now().isoformat(),
-                "chunk_index": i,
-                "total_chunks": len(nodes),
+                "created_at": created_at,
+                "total_chunks": len(file_nodes),
             }
-            metadata.append(meta)
 
-        collection = self.get_collection(collection_name)
+            # IDs are derived from chunk contents, so re-ingested chunks get the same IDs
+            file_chunks = {}
+            for i, node in enumerate(file_nodes):
+                # Get actual source file path from node metadata
+                file_path = node.metadata.get("file_path", str(path))
+                content = node.get_content()
+                unique_id = self._get_chunk_id(str(path), file_path, content)
+                meta = file_meta | {
+                    "id": unique_id,
+                    "file_path": file_path,
+                    "chunk_index": i,
+                }
+                file_chunks.setdefault(unique_id, (content, meta))
+                files.add(file_path)
+
+            # Skip chunks which are already stored instead of embedding them again
+            if file_chunks:
+                existing = collection.get(ids=list(file_chunks), include=[])
+                for unique_id in existing["ids"]:
+                    del file_chunks[unique_id]
+            if not file_chunks:
+                continue
+
+            file_contents = [content for content, _ in file_chunks.values()]
+            documents_content.extend(file_contents)
+            embeddings.extend(self._embed_texts(file_contents))
+            metadata.extend(meta for _, meta in file_chunks.values())
+
+            while len(metadata) >= batch_size:
+                self._add_chunks(
+                    collection,
+                    documents_content[:batch_size],
+                    embeddings[:batch_size],
+                    metadata[:batch_size],
+                )
+                del documents_content[:batch_size]
+                del embeddings[:batch_size]
+                del metadata[:batch_size]
+
+        if metadata:
+            self._add_chunks(collection, documents_content, embeddings, metadata)
+
+        self._update_collection_info(
+            db_version, collection_name, sources=[str(path)], files=list(files)
+        )
 
-        # Upsert documents with unique IDs and metadata
-        documents_content = [node.get_content() for node in nodes]
-        ids = [meta["id"] for meta in metadata]
+    def _add_chunks(
+        self,
+        collection,
+        documents_content: List[str],
+        embeddings: List[List[float]],
+        metadata: List[dict],
+    ) -> None:
+        """
+        Add new chunks with unique IDs, metadata and precomputed embeddings.
 
-        collection.upsert(documents=documents_content, metadatas=metadata, ids=ids)
+        Args:
+            collection (chromadb.Collection): The ChromaDB collection
+            documents_content (List[str]): Contents of the chunks
+            embeddings (List[List[float]]): Embeddings of the chunks
+            metadata (List[dict]): Metadata of the chunks including their IDs
+        """
+        # NOTE: stored chunks are filtered out before, so there is nothing to update
+        collection.add(
+            documents=documents_content,
+            embeddings=embeddings,
+            metadatas=metadata,
+            ids=[meta["id"] for meta in metadata],
+        )
+
+    def _get_chunk_id(self, source: str, file_path: str, content: str) -> str:
+        """
+        Get an ID of a chunk which stays the same when the chunk is ingested again.
+
+        Args:
+            source (str): Path the chunk was ingested from
+            file_path (str): Path of the file the chunk belongs to
+            content (str): Content of the chunk
+
+        Returns:
+            str: ID of the chunk
+        """
+        content_hash = hashlib.blake2b(digest_size=16)
+        for part in (source, file_path, content):
+            content_hash.update(part.encode())
+            content_hash.update(b"\0")
+        return content_hash.hexdigest()
+
+    def _iter_documents(
+        self, reader: SimpleDirectoryReader
+    ) -> Iterator[List[Document]]:
+        """
+        Read files in background threads and yield their documents in order as they get ready.
+
+        Args:
+            reader (SimpleDirectoryReader): Reader of the files to ingest
+
+        Returns:
+            Iterator[List[Document]]: Documents of each read file
+        """
+        queue = Queue(maxsize=self.INGEST_QUEUE_SIZE)
+        done = object()
+        errors = []
+        # Set when the consumer stops early, so that the reader does not block forever
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return
+                except Full:
+                    pass
+
+        def read_file(input_file: Path) -> List[Document]:
+            return SimpleDirectoryReader(
+                input_files=[input_file], file_extractor=reader.file_extractor
+            ).load_data()
+
+        def put_documents(future: Future):
+            if documents := future.result():
+                put(documents)
+
+        def read_files():
+            try:
+                with ThreadPoolExecutor(max_workers=self.READER_WORKERS) as executor:
+                    # Keep only a few files in flight, so that parsing does not run ahead
+                    pending = deque()
+                    for input_file in reader.input_files:
+                        if stop.is_set():
+                            break
+                        pending.append(executor.submit(read_file, input_file))
+                        if len(pending) >= self.READER_WORKERS:
+                            put_documents(pending.popleft())
+                    while pending and not stop.is_set():
+                        put_documents(pending.popleft())
+                    # Files not read yet are of no use once the consumer stopped
+                    for future in pending:
+                        future.cancel()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(done)
+
+        threading.Thread(target=read_files, daemon=True).start()
+
+        try:
+            while (documents := queue.get()) is not done:
+                yield documents
+        finally:
+            stop.set()
+
+        if errors:
+            raise errors[0]
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts sorted by length, so that each batch is padded to similar lengths.
+
+        Args:
+            texts (List[str]): Texts to embed
+
+        Returns:
+            List[List[float]]: Embeddings in the same order as texts
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        sorted_texts = [texts[i] for i in order]
+
+        sorted_embeddings = self.embed_model.get_text_embedding_batch(sorted_texts)
+
+        embeddings = [None] * len(texts)
+        for position, index in enumerate(order):
+            embeddings[index] = sorted_embeddings[position]
+        return embeddings
 
     def add_document(self, file_path: str, collection_name: str) -> None:
         """
@@ -198,18 +559,16 @@ class RAG(BaseModel):
             source_path (str): Source path of the document to delete
         """
         collection = self.get_collection(collection_name)
+        db_version = self._get_db_version()
 
-        # Get all document chunks with matching source path
-        # Note: Changed include parameter to only use "metadatas"
-        result = collection.get(
-            where={"source": str(source_path)}, include=["metadatas"]
-        )
+        # Get IDs of all document chunks with matching source path
+        result = collection.get(where={"source": str(source_path)}, include=[])
+        ids_to_delete = result["ids"]
 
-        # Get IDs from the metadata
-        if result["metadatas"]:
-            ids_to_delete = [meta["id"] for meta in result["metadatas"]]
+        if ids_to_delete:
             # Delete all chunks associated with the document
             collection.delete(ids=ids_to_delete)
+            self._update_collection_info(db_version, collection_name)
 
         # Check if collection is now empty
         remaining_docs = collection.count()
@@ -224,25 +583,21 @@ class RAG(BaseModel):
             old_name (str): Current name of the collection
             new_name (str): New name for the collection
         """
-        # Get the old collection
-        old_collection = self.get_collection(old_name)
+        collection = self.get_collection(old_name)
+        db_version = self._get_db_version()
 
-        # Get all documents from old collection
-        docs = old_collection.get()
+        # Rename in place, so that documents and embeddings stay where they are
+        collection.modify(name=new_name)
 
-        # Create new collection
-        new_collection = self.get_collection(new_name)
+        self._collections[new_name] = self._collections.pop(old_name)
+        if old_name in self._pipelines:
+            self._pipelines[new_name] = self._pipelines.pop(old_name)
 
-        # Copy documents to new collection if there are any
-        if docs["ids"]:
-            new_collection.add(
-                documents=docs["documents"],
-                metadatas=docs["metadatas"],
-                ids=docs["ids"],
-            )
-
-        # Delete old collection
-        self.delete_collection(old_name)
+        collection_infos = self._load_collection_infos(db_version)
+        if old_name in collection_infos:
+            collection_infos[new_name] = collection_infos.pop(old_name)
+            collection_infos[new_name]["name"] = new_name
+        self._save_collection_infos(self._get_db_version(), collection_infos)
 
     def get_document_info(self, collection_name: str, source_path: str) -> Dict:
         """
@@ -280,15 +635,13 @@ class RAG(BaseModel):
         Returns:
             IngestionPipeline: The pipeline for document processing
         """
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+
         if collection_name not in self._pipelines:
             collection = self.get_collection(collection_name)
             vector_store = ChromaVectorStore(chroma_collection=collection)
-            text_splitter = SentenceSplitter(
-                chunk_size=self.chunk_size,
-                chunk_overlap=self.chunk_overlap,
-            )
             self._pipelines[collection_name] = IngestionPipeline(
-                transformations=[TextCleaner(), text_splitter],
+                transformations=[TEXT_CLEANER, self._text_splitter],
                 vector_store=vector_store,
             )
         return self._pipelines[collection_name]
@@ -303,7 +656,25 @@ class RAG(BaseModel):
         Returns:
             chromadb.Collection: The ChromaDB collection
         """
-        return self.chroma_client.get_or_create_collection(name)
+        if name in self._collections:
+            return self._collections[name]
+
+        # NOTE: existence is checked explicitly, so that other failures (e.g. a locked
+        # or broken database) surface instead of being taken for a missing collection
+        if name in self.chroma_client.list_collections():
+            collection = self.chroma_client.get_collection(name)
+        else:
+            # NOTE: the embed model normalizes by default, so inner product ranks as
+            # cosine does while hnsw skips computing norms on every distance evaluation.
+            # Passing the space for existing collections would try to change it.
+            db_version = self._get_db_version()
+            collection = self.chroma_client.create_collection(
+                name, metadata={"hnsw:space": "ip"}
+            )
+            self._update_collection_info(db_version, name)
+
+        self._collections[name] = collection
+        return collection
 
     def load_collection(self, collection_name: str) -> None:
         """
@@ -312,6 +683,8 @@ class RAG(BaseModel):
         Args:
             collection_name (str): Name of the collection to load
         """
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+
         collection = self.get_collection(collection_name)
         vector_store = ChromaVectorStore(chroma_collection=collection)
         self._pipelines[collection_name] = IngestionPipeline(vector_store=vector_store)
@@ -333,15 +706,45 @@ class RAG(BaseModel):
         Returns:
             List[str]: Relevant context content
         """
+        # NOTE: the same filters object is passed for all questions in a RAG context
+        last_filters, where = self._last_where
+        if metadata_filters is not last_filters:
+            where = (
+                self._to_chroma_where(metadata_filters) if metadata_filters else None
+            )
+            self._last_where = (metadata_filters, where)
+
         collection = self.get_collection(collection_name)
-        vector_store = ChromaVectorStore(chroma_collection=collection)
-        index = VectorStoreIndex.from_vector_store(
-            vector_store, embed_model=self.embed_model
+        result = collection.query(
+            query_embeddings=[self._embed_query(query)],
+            n_results=self.similarity_top_k,
+            where=where,
+            include=["documents"],
         )
-        retriever = index.as_retriever(
-            similarity_top_k=self.similarity_top_k, filters=metadata_filters
-        )
-        return [node.get_content() for node in retriever.retrieve(query)]
+        return result["documents"][0]
+
+    def _to_chroma_where(self, metadata_filters: MetadataFilters) -> dict:
+        """
+        Translate metadata filters into a ChromaDB where clause.
+
+        Args:
+            metadata_filters (MetadataFilters): Metadata filtering criteria
+
+        Returns:
+            dict: The ChromaDB where clause
+        """
+        clauses = []
+        for metadata_filter in metadata_filters.filters:
+            if isinstance(metadata_filter, MetadataFilters):
+                clauses.append(self._to_chroma_where(metadata_filter))
+            else:
+                operator = self.CHROMA_OPERATORS[metadata_filter.operator.value]
+                clauses.append({metadata_filter.key: {operator: metadata_filter.value}})
+
+        # NOTE: ChromaDB requires at least two clauses for logical operators
+        if len(clauses) == 1:
+            return clauses[0]
+        return {f"${metadata_filters.condition.value}": clauses}
 
     def retrieve_prompt(
         self,
@@ -360,20 +763,44 @@ class RAG(BaseModel):
         Returns:
             str: A prompt to be used with LLM
         """
-        collection = self.get_collection(collection_name)
-        vector_store = ChromaVectorStore(chroma_collection=collection)
-        index = VectorStoreIndex.from_vector_store(
-            vector_store,
-            embed_model=self.embed_model,
-        )
-        query_engine = index.as_query_engine(
-            similarity_top_k=self.similarity_top_k,
-            filters=metadata_filters,
+        # Let the LLM get loaded while the context is being retrieved, unless
+        # it was preloaded recently and is still kept in memory
+        if self.llm_model.needs_preload():
+            threading.Thread(target=self.llm_model.preload, daemon=True).start()
+
+        context = self.retrieve_context(question, collection_name, metadata_filters)
+
+        return self._format_prompt(
+            question=question, context=self._join_context(context)
         )
 
-        context = [node.get_content() for node in query_engine.retrieve(question)]
+    def _join_context(self, context: List[str]) -> str:
+        """
+        Join retrieved chunks, most relevant first, while they fit into the share of
+        the LLM context window reserved for them.
 
-        return self._format_prompt(question=question, context=" ".join(context))
+        Args:
+            context (List[str]): Retrieved chunks ordered by relevance
+
+        Returns:
+            str: Context to put into a prompt
+        """
+        num_ctx = (
+            self.llm_model.options.get("num_ctx") if self.llm_model.options else None
+        ) or self.DEFAULT_NUM_CTX
+        max_length = int(num_ctx * self.CONTEXT_WINDOW_SHARE * self.CHARS_PER_TOKEN)
+        selected = []
+        length = 0
+        for chunk in context:
+            length += len(chunk) + (1 if selected else 0)
+            if length > max_length:
+                # Truncate the most relevant chunk rather than having no context at all
+                if not selected:
+                    selected.append(chunk[:max_length])
+                break
+            selected.append(chunk)
+
+        return " ".join(selected)
 
     def answer_question(
         self,
@@ -408,7 +835,10 @@ class RAG(BaseModel):
         Args:
             collection_name (str): Name of the collection to delete
         """
+        db_version = self._get_db_version()
         self.chroma_client.delete_collection(collection_name)
+        self._collections.pop(collection_name, None)
+        self._update_collection_info(db_version, collection_name)
         if collection_name in self._pipelines:
             del self._pipelines[collection_name]
 
@@ -3,7 +3,7 @@ This module provides classes and functions for recording and playing audio.
 """
 
 import logging
-from typing import Dict, List, Optional, Union
+from typing import Dict, Optional, Union
 
 import numpy as np
 import pygame.mixer
@@ -20,7 +20,7 @@ class AudioIO:
 
     Attributes:
         RATE: The sample rate for audio recording and playback (default: 24000).
-        CHUNK: The buffer size for audio recording (default: 2048).
+        CHUNK: The buffer size for audio recording (default: 4096).
         THRESHOLD: The threshold for detecting silence in audio data (default: 800).
         SILENCE_LIMIT: The number of seconds of silence before stopping recording (default: 3).
         pa: An instance of the PyAudio object.
@@ -28,7 +28,7 @@ class AudioIO:
     """
 
     RATE = 24000
-    CHUNK = 2048
+    CHUNK = 4096
     THRESHOLD = 800
     SILENCE_LIMIT = 30
 
@@ -102,7 +102,8 @@ class AudioIO:
         Returns:
             True if the audio data is silent, False otherwise.
         """
-        return np.max(data) < AudioIO.THRESHOLD
+        # NOTE: widen before abs, as abs of the int16 minimum overflows
+        return np.abs(data, dtype=np.int32).max() < AudioIO.THRESHOLD
 
     @staticmethod
     def play_wav(file_path: str) -> None:
@@ -137,7 +138,10 @@ class AudioIO:
         if not self.input_stream:
             self._initialize_input_stream()
 
-        frames: List[np.ndarray] = []
+        # NOTE: recording lasts at least SILENCE_LIMIT seconds unless interrupted,
+        # so the buffer rarely has to grow
+        frames = np.empty(self.RATE * (self.SILENCE_LIMIT + 5), dtype=np.int16)
+        frames_size = 0
         current_silence = 0
         recording = False
 
@@ -150,15 +154,22 @@ class AudioIO:
                 self.input_stream.read(self.CHUNK), dtype=np.int16
             )
 
-            if not recording and not self.is_silent(data):
+            is_silent = self.is_silent(data)
+
+            if not recording and not is_silent:
                 print_system_message(
                     "Sound detected, starting recording...", log_level=logging.INFO
                 )
                 recording = True
 
             if recording:
-                frames.append(data)
-                if self.is_silent(data):
+                if frames_size + len(data) > len(frames):
+                    grown_frames = np.empty(2 * len(frames), dtype=np.int16)
+                    grown_frames[:frames_size] = frames[:frames_size]
+                    frames = grown_frames
+                frames[frames_size : frames_size + len(data)] = data
+                frames_size += len(data)
+                if is_silent:
                     current_silence += 1
                 else:
                     current_silence = 0
@@ -176,10 +187,12 @@ class AudioIO:
         self.input_stream.stop_stream()
 
         if recording:
-            raw_data = np.hstack(frames)
+            raw_data = frames[:frames_size]
 
             # Convert to float32 and normalize for Hugging Face's `automatic-speech-recognition` pipeline.
-            normalized_data = raw_data.astype(np.float32) / np.iinfo(np.int16).max
+            normalized_data = np.multiply(
+                raw_data, np.float32(1.0 / np.iinfo(np.int16).max), dtype=np.float32
+            )
 
             return {
                 "raw": normalized_data,
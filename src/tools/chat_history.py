@@ -1,9 +1,17 @@
+import os
 import sqlite3
-from dataclasses import dataclass, asdict
+import sys
+from dataclasses import dataclass
 import json
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    # NOTE: orjson is installed along with chromadb, json is a fallback
+    orjson = None
+
 
 @dataclass
 class LLMSettings:
@@ -30,17 +38,29 @@ class LLMSettings:
 
     def to_dict(self) -> dict:
         """Convert to dictionary, excluding None values and returning None if all default."""
-        non_default = {k: v for k, v in asdict(self).items() if v is not None}
+        # Read fields directly, asdict() deep-copies every value first
+        non_default = {
+            k: v
+            for k, v in (
+                ("system_prompt", self.system_prompt),
+                ("model_id", self.model_id),
+                ("temperature", self.temperature),
+                ("num_ctx", self.num_ctx),
+                ("num_predict", self.num_predict),
+            )
+            if v is not None
+        }
         return non_default if non_default else None
 
 
 class ChatSettings:
     """Manages chat-specific settings."""
 
-    def __init__(self, markdown_enabled=True, replies_allowed=True, llm=LLMSettings()):
+    def __init__(self, markdown_enabled=True, replies_allowed=True, llm=None):
         self.markdown_enabled = markdown_enabled
         self.replies_allowed = replies_allowed
-        self.llm: LLMSettings = llm
+        # NOTE: a default instance would be shared (and mutated) by all settings
+        self.llm: LLMSettings = llm if llm is not None else LLMSettings()
 
     def to_dict(self) -> dict:
         """Convert settings to dictionary for serialization, excluding default values."""
@@ -62,11 +82,11 @@ class ChatSettings:
     @classmethod
     def from_dict(cls, data: dict) -> "ChatSettings":
         """Create settings from dictionary."""
-        settings = cls()
-        settings.markdown_enabled = data.get("markdown_enabled", True)
-        settings.replies_allowed = data.get("replies_allowed", True)
-        settings.llm = LLMSettings.from_dict(data.get("llm"))
-        return settings
+        return cls(
+            markdown_enabled=data.get("markdown_enabled", True),
+            replies_allowed=data.get("replies_allowed", True),
+            llm=LLMSettings.from_dict(data.get("llm")),
+        )
 
     def replace(self, **kwargs):
         # Create a new object with the specified updated attributes
@@ -76,14 +96,32 @@ class ChatSettings:
 class ChatHistoryDB:
     """SQLite database manager for chat history."""
 
+    # Applied to every connection, as each query opens its own: no fsync per
+    # commit in WAL mode (a power loss may drop the latest commits, but never
+    # corrupts the database) and waiting on locks instead of failing
+    CONNECTION_PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+    )
+
     def __init__(self, db_path: str):
         self.db_path = db_path
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the per-connection pragmas applied."""
+        conn = sqlite3.connect(self.db_path)
+        for pragma in self.CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
     def _init_db(self):
         """Initialize database schema."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            # Journal mode is persistent, so it is enough to set it once here
+            conn.execute("PRAGMA journal_mode=WAL")
+
             conn.execute(
                 """
                 CREATE TABLE IF NOT EXISTS nodes (
@@ -121,6 +159,22 @@ class ChatHistoryDB:
             """
             )
 
+            # Keep children and messages ordered by position on disk, so listing
+            # a group or loading a chat is an index range scan without sorting
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_nodes_parent
+                ON nodes (parent_id, position)
+            """
+            )
+
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_messages_node
+                ON messages (node_id, position)
+            """
+            )
+
             # Create root node if doesn't exist
             cursor = conn.execute("SELECT id FROM nodes WHERE parent_id IS NULL")
             if not cursor.fetchone():
@@ -131,35 +185,50 @@ class ChatHistoryDB:
 
     def _execute_query(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
         """Execute a query and return the cursor."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             return conn.execute(query, params)
 
     def _execute_many(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
         """Execute a many and return the cursor."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             return conn.executemany(query, params)
 
     def _fetch_one(self, query: str, params: tuple = ()) -> Any:
         """Fetch a single result from a query."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             return conn.execute(query, params).fetchone()
 
     def _fetch_all(self, query: str, params: tuple = ()) -> List[Any]:
         """Fetch all results from a query."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             return conn.execute(query, params).fetchall()
 
     def _get_node_id(self, path: List[str]) -> int:
         """Get node ID for given path."""
-        current_id = self._fetch_one("SELECT id FROM nodes WHERE parent_id IS NULL")[0]
+        return self._get_node_and_parent_id(path)[0]
+
+    def _get_node_and_parent_id(self, path: List[str]) -> tuple:
+        """Get node ID and its parent ID for given path in a single walk."""
+        parent_id = None
+
+        # Walk the whole path on one connection
+        with self._connect() as conn:
+            current_id = conn.execute(
+                "SELECT id FROM nodes WHERE parent_id IS NULL"
+            ).fetchone()[0]
 
-        for name in path:
-            current_id = self._fetch_one(
-                "SELECT id FROM nodes WHERE parent_id = ? AND name = ?",
-                (current_id, name),
-            )[0]
+            for name in path:
+                row = conn.execute(
+                    "SELECT id FROM nodes WHERE parent_id = ? AND name = ?",
+                    (current_id, name),
+                ).fetchone()
 
-        return current_id
+                if row is None:
+                    raise ValueError(f"Item not found at path: {'/'.join(path)}")
+
+                parent_id, current_id = current_id, row[0]
+
+        return current_id, parent_id
 
     def _update_message(self, node_id: int, position: int, content: str):
         """Update message content at given position."""
@@ -170,7 +239,7 @@ class ChatHistoryDB:
 
     def _delete_message(self, node_id: int, position: int):
         """Delete message and reorder remaining messages."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             conn.execute(
                 "DELETE FROM messages WHERE node_id = ? AND position = ?",
                 (node_id, position),
@@ -184,31 +253,73 @@ class ChatHistoryDB:
                 (node_id, position),
             )
 
+    def _delete_messages_by_role(self, node_id: int, role: str) -> int:
+        """Delete messages of given role and renumber remaining ones in one pass."""
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM messages WHERE node_id = ? AND role = ?",
+                (node_id, role),
+            ).rowcount
+
+            if deleted:
+                # Number remaining messages in a single ordered scan of the index
+                conn.execute(
+                    """
+                    UPDATE messages
+                    SET position = ordered.new_position
+                    FROM (
+                        SELECT id, ROW_NUMBER() OVER (ORDER BY position) - 1
+                            AS new_position
+                        FROM messages
+                        WHERE node_id = ?
+                    ) AS ordered
+                    WHERE messages.id = ordered.id
+                    AND messages.position != ordered.new_position
+                """,
+                    (node_id,),
+                )
+
+        return deleted
+
 
 class ChatHistory:
     """Manages chat history using SQLite storage."""
 
+    # Number of streamed tokens coalesced into a single database write
+    TOKEN_FLUSH_SIZE = 32
+
     def __init__(self, db_path: str, default_prompt: Optional[str], history_sort=False):
         self.db = ChatHistoryDB(db_path)
         self.default_prompt = default_prompt
         self.history_sort = history_sort
 
         self.active_path = self.get_active_chat()
+        # Resolved lazily so per-message operations skip the path walk
+        self._active_node_id: Optional[int] = None
+        # Node ids by path, evicted for subtrees whose paths change
+        self._node_ids: Dict[tuple, int] = {}
 
         # Cache for active chat messages
         self._active_messages: List[Dict[str, Any]] = []
         self._active_settings: Optional[ChatSettings] = None
+        # Tokens of the message being streamed, joined into its content on read
+        self._active_token_buf: Optional[List[str]] = None
+        # Streamed tokens not yet written to the database
+        self._active_unsaved_tokens: List[str] = []
 
         self.ensure_default_chat()
 
     def _load_active_chat(self):
         """Load active chat messages and settings into memory."""
+        self._active_token_buf = None
+        self._active_unsaved_tokens = []
         if not self.active_path:
             self._active_messages = []
             self._active_settings = ChatSettings()
             return
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._active_node_id = None
+        node_id = self._get_active_node_id()
 
         # Load messages
         messages = self.db._fetch_all(
@@ -223,7 +334,7 @@ class ChatHistory:
 
         self._active_messages = [
             {
-                "role": role,
+                "role": sys.intern(role),
                 "content": content,
                 **({"image_path": img_path} if img_path else {}),
             }
@@ -241,6 +352,66 @@ class ChatHistory:
             else ChatSettings()
         )
 
+    def _get_node_id(self, path: List[str]) -> int:
+        """Get node ID for given path, walking the tree only on a cache miss."""
+        key = tuple(path)
+        node_id = self._node_ids.get(key)
+        if node_id is None:
+            node_id = self._node_ids[key] = self.db._get_node_id(path)
+        return node_id
+
+    def _evict_node_ids(self, path: List[str]):
+        """Drop cached node ids of the node at path and all its descendants."""
+        prefix = tuple(path)
+        self._node_ids = {
+            key: node_id
+            for key, node_id in self._node_ids.items()
+            if key[: len(prefix)] != prefix
+        }
+
+    def _is_active_subtree(self, path: List[str]) -> bool:
+        """Check if the active chat is the node at path or one of its descendants."""
+        active_path = self.active_path
+        if not active_path or len(path) > len(active_path):
+            return False
+        return active_path[: len(path)] == path
+
+    def _get_active_node_id(self) -> int:
+        """Get node ID of the active chat, resolving its path only once."""
+        if self._active_node_id is None:
+            self._active_node_id = self._get_node_id(self.active_path)
+        return self._active_node_id
+
+    def _save_active_tokens(self):
+        """Write pending streamed tokens of the last active message to the database."""
+        if not self._active_unsaved_tokens:
+            return
+
+        self.db._execute_query(
+            """
+            UPDATE messages 
+            SET content = content || ?
+            WHERE node_id = ? AND position = ?
+            """,
+            (
+                "".join(self._active_unsaved_tokens),
+                self._get_active_node_id(),
+                len(self._active_messages) - 1,
+            ),
+        )
+        self._active_unsaved_tokens = []
+
+    def _flush_active_tokens(self):
+        """Materialize streamed tokens into the last active message content."""
+        self._save_active_tokens()
+        if self._active_token_buf:
+            self._active_messages[-1]["content"] = "".join(self._active_token_buf)
+        self._active_token_buf = None
+
+    def flush(self):
+        """Writes streamed tokens which are not yet saved to the database."""
+        self._flush_active_tokens()
+
     def create_chat(
         self, name: str, parent_path: Optional[List[str]] = None
     ) -> List[str]:
@@ -248,7 +419,7 @@ class ChatHistory:
         parent_path = parent_path or []
 
         # Get parent node ID
-        parent_id = self.db._get_node_id(parent_path)
+        parent_id = self._get_node_id(parent_path)
 
         # Check if name exists
         exists = self.db._fetch_one(
@@ -293,7 +464,8 @@ class ChatHistory:
         if not self.active_path:
             raise ValueError("No active chat selected")
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
 
         position = len(self._active_messages)
         self.db._execute_query(
@@ -305,7 +477,7 @@ class ChatHistory:
         )
 
         # Update cache
-        message = {"role": role, "content": content}
+        message = {"role": sys.intern(role), "content": content}
         if image_path:
             message["image_path"] = image_path
         self._active_messages.append(message)
@@ -314,27 +486,25 @@ class ChatHistory:
         """Append message token to active chat."""
         if is_first_token:
             self.append_message(role, token)
+            self._active_token_buf = [token]
         else:
             if not self.active_path:
                 raise ValueError("No active chat selected")
 
-            node_id = self.db._get_node_id(self.active_path)
-            last_position = len(self._active_messages) - 1
-
-            self.db._execute_query(
-                """
-                UPDATE messages 
-                SET content = content || ?
-                WHERE node_id = ? AND position = ?
-                """,
-                (token, node_id, last_position),
-            )
+            # Update cache, avoiding a full string rebuild per token
+            if self._active_token_buf is None:
+                self._active_token_buf = [self._active_messages[-1]["content"]]
+            self._active_token_buf.append(token)
 
-            # Update cache
-            self._active_messages[-1]["content"] += token
+            # Coalesce database writes, pending tokens are also saved on any
+            # read or modification of the active chat
+            self._active_unsaved_tokens.append(token)
+            if len(self._active_unsaved_tokens) >= self.TOKEN_FLUSH_SIZE:
+                self._save_active_tokens()
 
     def set_active_chat(self, path: List[str]):
         """Set active chat by path."""
+        self._save_active_tokens()
 
         self.db._execute_query(
             """
@@ -364,13 +534,11 @@ class ChatHistory:
         self, path: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """Get messages for chat at specified path."""
-        if path is None:
+        if path is None or path == self.active_path:
+            self._flush_active_tokens()
             return self._active_messages.copy()
 
-        if path == self.active_path:
-            return self._active_messages.copy()
-
-        node_id = self.db._get_node_id(path)
+        node_id = self._get_node_id(path)
 
         messages = self.db._fetch_all(
             """
@@ -384,7 +552,7 @@ class ChatHistory:
 
         return [
             {
-                "role": role,
+                "role": sys.intern(role),
                 "content": content,
                 **({"image_path": img_path} if img_path else {}),
             }
@@ -393,8 +561,17 @@ class ChatHistory:
 
     def get_nodes(self, path: Optional[List[str]] = None) -> List[Dict[str, str]]:
         """Get all nodes at the specified path."""
+        return [
+            {"name": name, "type": node_type}
+            for name, node_type in self.iter_nodes(path)
+        ]
+
+    def iter_nodes(
+        self, path: Optional[List[str]] = None
+    ) -> Iterator[Tuple[str, str]]:
+        """Iterate over (name, type) of nodes at the specified path."""
         path = path or []
-        parent_id = self.db._get_node_id(path)
+        parent_id = self._get_node_id(path)
 
         nodes = self.db._fetch_all(
             """
@@ -406,14 +583,10 @@ class ChatHistory:
             (parent_id,),
         )
 
-        nodes = [{"name": name, "type": node_type} for name, node_type in nodes]
-
         if self.history_sort:
-            return sorted(
-                nodes, key=lambda x: (x["type"] != "group", x["name"].lower())
-            )
+            nodes.sort(key=lambda row: (row[1] != "group", row[0].lower()))
 
-        return nodes
+        return iter(nodes)
 
     def create_group(
         self, name: str, parent_path: Optional[List[str]] = None
@@ -421,7 +594,7 @@ class ChatHistory:
         """Create a new group at specified path."""
         parent_path = parent_path or []
 
-        parent_id = self.db._get_node_id(parent_path)
+        parent_id = self._get_node_id(parent_path)
 
         # Check if name exists
         exists = self.db._fetch_one(
@@ -450,10 +623,7 @@ class ChatHistory:
 
     def rename_node(self, old_path: List[str], new_name: str):
         """Rename group or chat at specified path."""
-        node_id = self.db._get_node_id(old_path)
-        parent_id = self.db._fetch_one(
-            "SELECT parent_id FROM nodes WHERE id = ?", (node_id,)
-        )[0]
+        node_id, parent_id = self.db._get_node_and_parent_id(old_path)
 
         # Check if new name exists in parent
         exists = self.db._fetch_one(
@@ -467,16 +637,17 @@ class ChatHistory:
         self.db._execute_query(
             "UPDATE nodes SET name = ? WHERE id = ?", (new_name, node_id)
         )
+        self._evict_node_ids(old_path)
 
         # Update active path if needed
-        if self.active_path and old_path == self.active_path[: len(old_path)]:
+        if self._is_active_subtree(old_path):
             self.active_path = (
                 old_path[:-1] + [new_name] + self.active_path[len(old_path) :]
             )
 
     def delete_node(self, path: List[str]):
         """Delete group or chat at specified path."""
-        node_id = self.db._get_node_id(path)
+        node_id = self._get_node_id(path)
 
         # Delete all descendant nodes and their messages recursively
         # Split the recursive query into two separate statements
@@ -503,10 +674,14 @@ class ChatHistory:
         self.db._execute_many(
             "DELETE FROM nodes WHERE id = ?", [(nid,) for nid in node_ids]
         )
+        self._evict_node_ids(path)
 
         # Reset active path if deleting active chat or its parent
-        if self.active_path and path == self.active_path[: len(path)]:
+        if self._is_active_subtree(path):
             self.active_path = None
+            self._active_node_id = None
+            self._active_token_buf = None
+            self._active_unsaved_tokens = []
             self._active_messages = []
             self._active_settings = None
 
@@ -517,53 +692,61 @@ class ChatHistory:
         position: Optional[int] = None,
     ):
         """Move a node to a new location with optional position, including within the same parent."""
-        source_id = self.db._get_node_id(source_path)
-        target_id = self.db._get_node_id(target_path)
+        source_id = self._get_node_id(source_path)
+        target_id = self._get_node_id(target_path)
 
-        source_name, source_parent_id, source_position = self.db._fetch_one(
-            "SELECT name, parent_id, position FROM nodes WHERE id = ?", (source_id,)
-        )
+        # Check and reorder within a single transaction
+        with self.db._connect() as conn:
+            source_name, source_parent_id, source_position = conn.execute(
+                "SELECT name, parent_id, position FROM nodes WHERE id = ?",
+                (source_id,),
+            ).fetchone()
 
-        # Check if moving within the same parent
-        is_same_parent = source_parent_id == target_id
+            # Check if moving within the same parent
+            is_same_parent = source_parent_id == target_id
 
-        # Check if name already exists in the target, excluding the node being moved
-        exists = self.db._fetch_one(
-            """
-            SELECT 1 FROM nodes 
-            WHERE parent_id = ? AND name = ? AND id != ?
-            """,
-            (target_id, source_name, source_id),
-        )
+            # Check if name already exists in the target, excluding the node being moved
+            exists = conn.execute(
+                """
+                SELECT 1 FROM nodes 
+                WHERE parent_id = ? AND name = ? AND id != ?
+                """,
+                (target_id, source_name, source_id),
+            ).fetchone()
 
-        if exists:
-            raise ValueError(
-                f"Item '{source_name}' already exists in the target location."
-            )
+            if exists:
+                raise ValueError(
+                    f"Item '{source_name}' already exists in the target location."
+                )
 
-        if position is not None:
-            if is_same_parent:
-                # Remove source node's position before shifting others
-                self.db._execute_query(
+            if position is not None:
+                if is_same_parent:
+                    # Remove source node's position before shifting others
+                    conn.execute(
+                        """
+                        UPDATE nodes 
+                        SET position = position - 1 
+                        WHERE parent_id = ? AND position > ?
+                        """,
+                        (source_parent_id, source_position),
+                    )
+
+                # Shift positions for target parent
+                conn.execute(
                     """
                     UPDATE nodes 
-                    SET position = position - 1 
-                    WHERE parent_id = ? AND position > ?
+                    SET position = position + 1
+                    WHERE parent_id = ? AND position >= ?
                     """,
-                    (source_parent_id, source_position),
+                    (target_id, position),
                 )
+            else:
+                # Move to the end of target
+                position = conn.execute(
+                    "SELECT COUNT(*) FROM nodes WHERE parent_id = ?", (target_id,)
+                ).fetchone()[0]
 
-            # Shift positions for target parent
-            self.db._execute_query(
-                """
-                UPDATE nodes 
-                SET position = position + 1
-                WHERE parent_id = ? AND position >= ?
-                """,
-                (target_id, position),
-            )
-
-            self.db._execute_query(
+            conn.execute(
                 """
                 UPDATE nodes 
                 SET parent_id = ?, position = ?
@@ -571,38 +754,24 @@ class ChatHistory:
                 """,
                 (target_id, position, source_id),
             )
-        else:
-            # Move to the end of target
-            new_position = self.db._fetch_one(
-                "SELECT COUNT(*) FROM nodes WHERE parent_id = ?", (target_id,)
-            )[0]
 
-            self.db._execute_query(
-                """
-                UPDATE nodes 
-                SET parent_id = ?, position = ?
-                WHERE id = ?
-                """,
-                (target_id, new_position, source_id),
-            )
+        self._evict_node_ids(source_path)
 
         # Update active path if needed
-        if self.active_path and source_path == self.active_path[: len(source_path)]:
+        if self._is_active_subtree(source_path):
             self.active_path = (
                 target_path + [source_name] + self.active_path[len(source_path) :]
             )
 
     def get_chat_settings(self, path: Optional[List[str]] = None) -> ChatSettings:
         """Get settings for specified chat."""
-        if path is None:
+        # Active chat settings are loaded lazily once and returned without copying
+        if path is None or path == self.active_path:
             if not self._active_settings:
                 self._load_active_chat()
             return self._active_settings
 
-        if path == self.active_path:
-            return self._active_settings
-
-        node_id = self.db._get_node_id(path)
+        node_id = self._get_node_id(path)
 
         settings_json = self.db._fetch_one(
             "SELECT settings FROM nodes WHERE id = ?", (node_id,)
@@ -622,7 +791,11 @@ class ChatHistory:
         if not path:
             raise ValueError("No chat selected")
 
-        node_id = self.db._get_node_id(path)
+        node_id = (
+            self._get_active_node_id()
+            if path == self.active_path
+            else self._get_node_id(path)
+        )
 
         self.db._execute_query(
             "UPDATE nodes SET settings = ? WHERE id = ?",
@@ -637,7 +810,8 @@ class ChatHistory:
         if not self.active_path:
             raise ValueError("No active chat selected")
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
         self.db._update_message(node_id, position, content)
         self._active_messages[position]["content"] = content
 
@@ -646,7 +820,8 @@ class ChatHistory:
         if not self.active_path:
             raise ValueError("No active chat selected")
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
         self.db._delete_message(node_id, position)
         del self._active_messages[position]
 
@@ -654,37 +829,72 @@ class ChatHistory:
         """Returns last message in the active chat."""
         if not self._active_messages:
             raise ValueError("No messages in active chat")
+        self._flush_active_tokens()
         return self._active_messages[-1].copy()
 
+    def get_last_message_role(self) -> Optional[str]:
+        """Returns role of the last message in the active chat without copying."""
+        return self._active_messages[-1]["role"] if self._active_messages else None
+
     def set_active_chat_history(self, messages: List[Dict[str, Any]]):
         """Sets history of an active chat."""
         if not self.active_path:
             raise ValueError("No active chat selected")
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
 
         # Delete existing messages
         self.db._execute_query("DELETE FROM messages WHERE node_id = ?", (node_id,))
 
         # Insert new messages
-        for i, msg in enumerate(messages):
-            self.db._execute_query(
-                """
-                INSERT INTO messages (node_id, role, content, image_path, position)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (node_id, msg["role"], msg["content"], msg.get("image_path"), i),
-            )
+        self._insert_messages(node_id, messages, 0)
 
         # Update cache
         self._active_messages = messages.copy()
 
+    def append_messages(self, messages: List[Dict[str, Any]]):
+        """Append multiple messages to active chat in a single batch."""
+        if not self.active_path:
+            raise ValueError("No active chat selected")
+
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
+
+        self._insert_messages(node_id, messages, len(self._active_messages))
+
+        # Update cache
+        self._active_messages.extend(
+            {
+                "role": sys.intern(msg["role"]),
+                "content": msg["content"],
+                **({"image_path": msg["image_path"]} if msg.get("image_path") else {}),
+            }
+            for msg in messages
+        )
+
+    def _insert_messages(
+        self, node_id: int, messages: List[Dict[str, Any]], start_position: int
+    ):
+        """Insert messages of a chat starting at given position."""
+        self.db._execute_many(
+            """
+            INSERT INTO messages (node_id, role, content, image_path, position)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [
+                (node_id, msg["role"], msg["content"], msg.get("image_path"), i)
+                for i, msg in enumerate(messages, start_position)
+            ],
+        )
+
     def clear_all_messages(self):
         """Clear all messages for the active chat."""
         if not self.active_path:
             raise ValueError("No active chat selected")
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
 
         self.db._execute_query("DELETE FROM messages WHERE node_id = ?", (node_id,))
 
@@ -695,11 +905,12 @@ class ChatHistory:
         if not self.active_path:
             raise ValueError("No active chat selected")
 
+        self._flush_active_tokens()
         n = max(0, min(n, len(self._active_messages)))
         if n == 0:
             return
 
-        node_id = self.db._get_node_id(self.active_path)
+        node_id = self._get_active_node_id()
         start_position = len(self._active_messages) - n
 
         self.db._execute_query(
@@ -717,45 +928,12 @@ class ChatHistory:
         if not self.active_path:
             raise ValueError("No active chat selected")
 
-        node_id = self.db._get_node_id(self.active_path)
+        self._flush_active_tokens()
+        node_id = self._get_active_node_id()
 
-        # Get positions of messages to delete
-        positions = [
-            row[0]
-            for row in self.db._fetch_all(
-                """
-                SELECT position 
-                FROM messages 
-                WHERE node_id = ? AND role = ?
-                ORDER BY position
-                """,
-                (node_id, role),
-            )
-        ]
-
-        if not positions:
+        if not self.db._delete_messages_by_role(node_id, role):
             return
 
-        # Delete messages with specified role
-        self.db._execute_query(
-            """
-            DELETE FROM messages 
-            WHERE node_id = ? AND role = ?
-            """,
-            (node_id, role),
-        )
-
-        # Update positions for remaining messages
-        for i, pos in enumerate(positions):
-            self.db._execute_query(
-                """
-                UPDATE messages 
-                SET position = position - 1
-                WHERE node_id = ? AND position > ?
-                """,
-                (node_id, pos - i),
-            )
-
         # Update cache
         self._active_messages = [
             msg for msg in self._active_messages if msg["role"] != role
@@ -794,109 +972,205 @@ class ChatHistory:
     #     print("Node Hierarchy:")
     #     print_node(root_id)
 
-    def save_chats(self, filepath: str):
-        """Export chat history from SQLite to a JSON file."""
-        try:
-            Path(filepath).parent.mkdir(parents=True, exist_ok=True)
-
-            def get_node_data(path: List[str] = None) -> dict:
-                """Recursively get all chats and groups data."""
-                result = {}
-                nodes = self.get_nodes(path)
+    def _iter_chat_exports(self, conn: sqlite3.Connection):
+        """Yield (name, data) of every chat in tree order for export."""
+        # Load the whole tree with a single query instead of walking paths
+        children: Dict[Optional[int], List[tuple]] = {}
+        for row in conn.execute(
+            """
+            SELECT id, name, type, parent_id, settings
+            FROM nodes
+            ORDER BY parent_id, position
+            """
+        ):
+            children.setdefault(row[3], []).append(row)
+
+        active_id = self._active_node_id if self.active_path else None
+        root_id = children[None][0][0]
+
+        def get_children(parent_id: int):
+            nodes = children.get(parent_id, [])
+            if self.history_sort:
+                nodes = sorted(nodes, key=lambda x: (x[2] != "group", x[1].lower()))
+            return iter(nodes)
+
+        # Iterative pre-order traversal, each group string is built once
+        group_cache = {root_id: "/"}
+        chat_nodes = []
+        stack = [get_children(root_id)]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+
+            node_id, name, node_type, parent_id, _ = node
+            if node_type == "chat":
+                chat_nodes.append(node)
+            elif node_type == "group":
+                prefix = "" if parent_id == root_id else group_cache[parent_id]
+                group_cache[node_id] = f"{prefix}/{name}"
+                stack.append(get_children(node_id))
+
+        # Chats are keyed by name, so only the last chat with a given name is
+        # exported, as a dict built from all of them would keep
+        last_ids = {node[1]: node[0] for node in chat_nodes}
+
+        for node_id, name, _, parent_id, settings_json in chat_nodes:
+            if last_ids[name] != node_id:
+                continue
+
+            if node_id == active_id and self._active_settings:
+                settings = self._active_settings
+            else:
+                settings = ChatSettings.from_dict(
+                    json.loads(settings_json) if settings_json else {}
+                )
 
-                for node in nodes:
-                    current_path = (path or []) + [node["name"]]
+            if node_id == active_id:
+                messages = self._active_messages.copy()
+            else:
+                messages = [
+                    {
+                        "role": sys.intern(role),
+                        "content": content,
+                        **({"image_path": img_path} if img_path else {}),
+                    }
+                    for role, content, img_path in conn.execute(
+                        """
+                        SELECT role, content, image_path
+                        FROM messages
+                        WHERE node_id = ?
+                        ORDER BY position
+                        """,
+                        (node_id,),
+                    )
+                ]
+
+            yield name, {
+                "messages": messages,
+                "settings": settings.to_dict(),
+                "group": group_cache[parent_id],
+            }
 
-                    if node["type"] == "chat":
-                        messages = self.get_chat_messages(current_path)
-                        settings = self.get_chat_settings(current_path)
+    def save_chats(self, filepath: str, pretty: bool = False):
+        """Export chat history from SQLite to a JSON file, indented if `pretty`."""
+        try:
+            Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+            self._flush_active_tokens()
+
+            def dumps(obj) -> bytes:
+                if orjson:
+                    return orjson.dumps(
+                        obj, option=orjson.OPT_INDENT_2 if pretty else None
+                    )
+                return json.dumps(
+                    obj,
+                    ensure_ascii=False,
+                    **({"indent": 2} if pretty else {"separators": (",", ":")}),
+                ).encode()
+
+            # Write to a temporary file and swap it in atomically, so a failed
+            # save never leaves a truncated export behind
+            tmp_path = Path(filepath).with_name(Path(filepath).name + ".tmp")
 
-                        # Get full group path excluding chat name
-                        group_path = "/" + "/".join(path) if path else "/"
+            try:
+                with self.db._connect() as conn, open(tmp_path, "wb") as f:
+                    chats = self._iter_chat_exports(conn)
 
-                        result[node["name"]] = {
-                            "messages": messages,
-                            "settings": settings.to_dict(),
-                            "group": group_path,
+                    if pretty:
+                        save_data = {
+                            "chats": dict(chats),
+                            "active_path": self.active_path,
                         }
-                    elif node["type"] == "group":
-                        result.update(get_node_data(current_path))
-
-                return result
-
-            save_data = {"chats": get_node_data(), "active_path": self.active_path}
-
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(save_data, f, indent=2, ensure_ascii=False)
+                        f.write(dumps(save_data))
+                    else:
+                        # Stream chats one by one, so only a single chat's
+                        # messages are held in memory at a time
+                        f.write(b'{"chats":{')
+                        for i, (name, chat) in enumerate(chats):
+                            f.write(b"," if i else b"")
+                            f.write(dumps(name) + b":" + dumps(chat))
+                        f.write(b'},"active_path":')
+                        f.write(dumps(self.active_path) + b"}")
+
+                os.replace(tmp_path, filepath)
+            except BaseException:
+                tmp_path.unlink(missing_ok=True)
+                raise
 
         except IOError as e:
             raise IOError(f"Failed to save chat history: {str(e)}")
 
     def load_chats(self, file_path: str):
         """Import chat data from JSON file into SQLite database."""
-        with open(file_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-
-        # Reset database except root
-        self.db._execute_query("DELETE FROM messages")
-        self.db._execute_query("DELETE FROM nodes WHERE parent_id IS NOT NULL")
-
-        def create_path(path_components: List[str], is_chat=False, chat_data=None):
-            """Recursively create path and return final node id."""
-            current_path = []
-            for component in path_components:
-                current_path.append(component)
-
-                try:
-                    # Try to get existing node id
-                    self.db._get_node_id(current_path)
-                except:
-                    # Create new node if doesn't exist
-                    if component == path_components[-1] and is_chat:
-                        new_path = self.create_chat(component, current_path[:-1])
-                        node_id = self.db._get_node_id(new_path)
-
-                        # Update settings and messages
-                        if chat_data:
-                            self.set_chat_settings(
-                                ChatSettings.from_dict(chat_data.get("settings", {})),
-                                new_path,
-                            )
-
-                            # Clear default welcome message
-                            self.db._execute_query(
-                                "DELETE FROM messages WHERE node_id = ?", (node_id,)
-                            )
-
-                            # Import messages
-                            for i, msg in enumerate(chat_data.get("messages", [])):
-                                self.db._execute_query(
-                                    """
-                                    INSERT INTO messages 
-                                    (node_id, role, content, image_path, position)
-                                    VALUES (?, ?, ?, ?, ?)
-                                    """,
-                                    (
-                                        node_id,
-                                        msg["role"],
-                                        msg["content"],
-                                        msg.get("image_path"),
-                                        i,
-                                    ),
-                                )
-                    else:
-                        self.create_group(component, current_path[:-1])
-
-            return current_path
-
-        # Import chats
-        for chat_name, chat_data in data.get("chats", {}).items():
-            group_path = chat_data.get("group", "/").strip("/").split("/")
-            if group_path == [""]:
-                group_path = []
+        if orjson:
+            data = orjson.loads(Path(file_path).read_bytes())
+        else:
+            with open(file_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+
+        with self.db._connect() as conn:
+            # Reset database except root
+            conn.execute("DELETE FROM messages")
+            conn.execute("DELETE FROM nodes WHERE parent_id IS NOT NULL")
+            root_id = conn.execute(
+                "SELECT id FROM nodes WHERE parent_id IS NULL"
+            ).fetchone()[0]
+
+            # Created node ids by path and child counts by node id, so missing
+            # groups are created without re-walking the tree for every chat
+            node_ids = {(): root_id}
+            child_counts = {root_id: 0}
+
+            def create_node(path: tuple, node_type: str, settings=None) -> int:
+                parent_id = node_ids[path[:-1]]
+                cursor = conn.execute(
+                    """
+                    INSERT INTO nodes (name, type, parent_id, position, settings)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (path[-1], node_type, parent_id, child_counts[parent_id], settings),
+                )
+                child_counts[parent_id] += 1
+                child_counts[cursor.lastrowid] = 0
+                node_ids[path] = cursor.lastrowid
+                return cursor.lastrowid
+
+            # Import chats
+            for chat_name, chat_data in data.get("chats", {}).items():
+                group_path = chat_data.get("group", "/").strip("/").split("/")
+                if group_path == [""]:
+                    group_path = []
+
+                path = ()
+                for component in group_path:
+                    path += (component,)
+                    if path not in node_ids:
+                        create_node(path, "group")
+
+                path += (chat_name,)
+                if path in node_ids:
+                    continue
+
+                settings = ChatSettings.from_dict(chat_data.get("settings", {}))
+                node_id = create_node(path, "chat", json.dumps(settings.to_dict()))
+
+                conn.executemany(
+                    """
+                    INSERT INTO messages 
+                    (node_id, role, content, image_path, position)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        (node_id, msg["role"], msg["content"], msg.get("image_path"), i)
+                        for i, msg in enumerate(chat_data.get("messages", []))
+                    ),
+                )
 
-            full_path = group_path + [chat_name]
-            create_path(full_path, is_chat=True, chat_data=chat_data)
+        self._active_node_id = None
+        self._active_unsaved_tokens = []
+        self._node_ids.clear()
 
         # Set active chat
         active_path = data.get("active_path")
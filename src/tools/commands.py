@@ -113,14 +113,16 @@ def handle_command(self, command):
 
         messages = self.chat_history.get_active_chat_messages()
         total_messages = len(messages)
-        total_words = sum(len(message["content"].split()) for message in messages)
+        total_words = 0
 
         role_message_count = {}
         role_word_count = {}
 
         for message in messages:
             role = message["role"]
+            # Split each message only once and reuse the count for all totals
             words_in_message = len(message["content"].split())
+            total_words += words_in_message
             # Update message count per role
             role_message_count[role] = role_message_count.get(role, 0) + 1
             # Update word count per role
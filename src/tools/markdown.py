@@ -49,6 +49,13 @@ class MarkdownProcessor:
         re.MULTILINE | re.VERBOSE,
     )
 
+    # Line level patterns used by renderers, compiled once instead of per line
+    MARKDOWN_BLOCK_PATTERN = re.compile(r"```markdown\s*([\s\S]*?)\s*```", re.MULTILINE)
+    HORIZONTAL_RULE_PATTERN = re.compile(r"^[-*_]{3,}$")
+    TASK_LIST_PATTERN = re.compile(r"^(\s*)[-*•] \[([xX ])\] (.+)$")
+    SIMPLE_TASK_LIST_PATTERN = re.compile(r"^[-*] \[([x ])\] (.+)$")
+    LIST_PATTERN = re.compile(r"^(\s*)([-*]|\d+\.)\s+(.+)$")
+
     def __init__(self, chat_display: ScrolledText, theme: dict = None):
         self.chat_display = chat_display
         self.theme = theme or {
@@ -69,9 +76,9 @@ class MarkdownProcessor:
             # Remove any leading/trailing whitespace and newlines
             return content if content else ""
 
-        # Regex pattern for ```markdown blocks
-        pattern = re.compile(r"```markdown\s*([\s\S]*?)\s*```", re.MULTILINE)
-        return pattern.sub(replace_markdown_block, text)
+        return MarkdownProcessor.MARKDOWN_BLOCK_PATTERN.sub(
+            replace_markdown_block, text
+        )
 
     def setup_markdown_tags(self):
         for level in range(1, 7):
@@ -191,7 +198,7 @@ class MarkdownProcessor:
                 continue
 
             # Horizontal rules
-            if re.match(r"^[-*_]{3,}$", line.strip()):
+            if self.HORIZONTAL_RULE_PATTERN.match(line.strip()):
                 self.chat_display.insert(tk.END, "_" * 60 + "\n", "hr")
                 i += 1
                 continue
@@ -207,7 +214,7 @@ class MarkdownProcessor:
                 continue
 
             # Task lists
-            task_match = re.match(r"^(\s*)[-*•] \[([xX ])\] (.+)$", line)
+            task_match = self.TASK_LIST_PATTERN.match(line)
             if task_match:
                 indent, check, content = task_match.groups()
                 indent_level = len(indent) // 2  # Handle nested task lists
@@ -240,7 +247,7 @@ class MarkdownProcessor:
                 continue
 
             # Lists
-            list_match = re.match(r"^(\s*)([-*]|\d+\.)\s+(.+)$", line)
+            list_match = self.LIST_PATTERN.match(line)
             if list_match:
                 indent, marker, content = list_match.groups()
                 indent_level = len(indent) // 2
@@ -443,7 +450,7 @@ class MarkdownProcessor:
                 continue
 
             # Horizontal rules
-            if re.match(r"^[-*_]{3,}$", line.strip()):
+            if self.HORIZONTAL_RULE_PATTERN.match(line.strip()):
                 self.chat_display.insert(tk.END, "_" * 60 + "\n", "hr")
                 i += 1
                 continue
@@ -459,7 +466,7 @@ class MarkdownProcessor:
                 continue
 
             # Lists
-            list_match = re.match(r"^(\s*)([-*]|\d+\.)\s+(.+)$", line)
+            list_match = self.LIST_PATTERN.match(line)
             if list_match:
                 indent, marker, content = list_match.groups()
                 indent_level = len(indent) // 2
@@ -477,7 +484,7 @@ class MarkdownProcessor:
                 continue
 
             # Task lists
-            task_match = re.match(r"^[-*] \[([x ])\] (.+)$", line)
+            task_match = self.SIMPLE_TASK_LIST_PATTERN.match(line)
             if task_match:
                 is_complete = task_match.group(1) == "x"
                 tag = "task_complete" if is_complete else "task_incomplete"
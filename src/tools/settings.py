@@ -68,6 +68,10 @@ default_config = {
         "persist_dir": ".chromadb",
         "embed_cache": ".cache",
         "embed_model_name": "all-MiniLM-L6-v2",
+        # "torch" or "onnx" to run int8 quantized embed model with ONNX Runtime on CPU
+        "embed_backend": "torch",
+        # amount of chunks embedded at once, similar length chunks are batched together
+        "embed_batch_size": 64 if settings.TORCH_DEVICE == "cuda" else 32,
         "chunk_size": 2048,
         "chunk_overlap": 128,
         "similarity_top_k": 4,
@@ -350,10 +350,8 @@ class ChatTree:
             self.tree.delete(item)
 
         def add_nodes(parent_path="", tree_parent=""):
-            nodes = self.chat_history.get_nodes(parent_path)
-            for node in nodes:
-                name = node["name"]
-                is_group = node["type"] == "group"
+            for name, node_type in self.chat_history.iter_nodes(parent_path):
+                is_group = node_type == "group"
 
                 # Insert node into tree
                 item_id = self.tree.insert(
@@ -423,6 +423,15 @@ class RAGPanelUI:
             self.on_context_set(None, None)
             return None
 
+        # When all documents are selected, a source filter only makes Chroma
+        # post-filter every candidate, so query the whole collection instead
+        collection_documents = self.data_store_tree.get_children(
+            f"collection_{self.current_collection}"
+        )
+        if set(document_items).issuperset(collection_documents):
+            self.on_context_set(self.current_collection, metadata_filters=None)
+            return None
+
         selected_sources = {
             self.data_store_tree.item(item)["tags"][0] for item in document_items
         }